@@ -1,14 +1,22 @@
 """DNS Authenticator for OpenIPAM."""
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import threading
+import time
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Any
 from typing import Callable
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 
+from acme import challenges
+from certbot import achallenges
 from certbot import errors
+from certbot.display import util as display_util
 from certbot.plugins import dns_common
 from certbot.plugins.dns_common import CredentialsConfiguration
 
@@ -16,6 +24,9 @@ logger = logging.getLogger(__name__)
 
 ACCOUNT_URL = 'https://openipam.usu.edu/api/'
 
+# Upper bound on the number of API requests in flight at once.
+MAX_WORKERS = 8
+
 
 class Authenticator(dns_common.DNSAuthenticator):
     """DNS Authenticator for OpenIPAM
@@ -30,6 +41,7 @@ class Authenticator(dns_common.DNSAuthenticator):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
         self.credentials: Optional[CredentialsConfiguration] = None
+        self._client: Optional[_OpenIPAMClient] = None
 
     @classmethod
     def add_parser_arguments(cls, add: Callable[..., None],
@@ -53,6 +65,34 @@ class Authenticator(dns_common.DNSAuthenticator):
             None,
             self._validate_credentials
         )
+        if self._client is not None:
+            self._client.close()
+        # Credentials do not change for the rest of the run, so one client serves every call.
+        self._client = _OpenIPAMClient(None, self.credentials.conf('api-token'))
+
+    def perform(self, achalls: List[achallenges.AnnotatedChallenge]
+                ) -> List[challenges.ChallengeResponse]:
+        self._setup_credentials()
+
+        self._attempt_cleanup = True
+
+        self._run_all(self._perform, achalls)
+
+        # Same propagation wait as DNSAuthenticator.perform.
+        display_util.notify('Waiting %d seconds for DNS changes to propagate'
+                            % self.conf('propagation-seconds'))
+        time.sleep(self.conf('propagation-seconds'))
+
+        return [achall.response(achall.account_key) for achall in achalls]
+
+    def cleanup(self, achalls: List[achallenges.AnnotatedChallenge]) -> None:
+        if self._attempt_cleanup:
+            try:
+                self._run_all(self._cleanup, achalls)
+            finally:
+                if self._client is not None:
+                    self._client.close()
+                    self._client = None
 
     def _perform(self, domain: str, validation_name: str, validation: str) -> None:
         self._get_openipam_client().add_txt_record(domain, validation_name, validation, self.ttl)
@@ -60,11 +100,79 @@ class Authenticator(dns_common.DNSAuthenticator):
     def _cleanup(self, domain: str, validation_name: str, validation: str) -> None:
         self._get_openipam_client().del_txt_record(domain, validation_name, validation)
 
+    def _run_all(self, func: Callable[[str, str, str], None],
+                 achalls: List[achallenges.AnnotatedChallenge]) -> None:
+        """
+        Call ``func`` for every challenge, issuing the API requests concurrently.
+
+        OpenIPAM has no bulk endpoint, so N challenges still need N requests; running them on a
+        thread pool over the shared session costs roughly one round-trip instead of N.
+
+        :param func: Either `_perform` or `_cleanup`.
+        :param list achalls: The challenges to process.
+        """
+        # Challenges that need an identical TXT record share a single API call. The key is
+        # derived the same way in perform and cleanup, so a shared record is deleted once.
+        unique: Dict[Tuple[str, str], Tuple[str, str, str]] = {}
+        for achall in achalls:
+            domain = _achall_domain(achall)
+            validation_name = achall.validation_domain_name(domain)
+            validation = achall.validation(achall.account_key)
+            unique.setdefault((validation_name, validation),
+                              (domain, validation_name, validation))
+        records = list(unique.values())
+        if not records:
+            return
+        if len(records) == 1:
+            func(*records[0])
+            return
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(records))) as executor:
+            # Consume the results so that any exception is re-raised here.
+            list(executor.map(lambda record: func(*record), records))
+
     def _get_openipam_client(self) -> "_OpenIPAMClient":
-        if not self.credentials:  # pragma: no cover
+        if not self._client:  # pragma: no cover
             raise errors.Error("Plugin has not been prepared.")
-        if self.credentials.conf('api-token'):
-            return _OpenIPAMClient(None, self.credentials.conf('api-token'))
+        return self._client
+
+
+def _achall_domain(achall: achallenges.AnnotatedChallenge) -> str:
+    """
+    Return the domain a challenge is for.
+
+    Newer certbot deprecates ``achall.domain`` in favour of ``achall.identifier.value``; older
+    releases only have the former.
+    """
+    identifier = getattr(achall, 'identifier', None)
+    if identifier is not None:
+        return identifier.value
+    return achall.domain
+
+
+_shared_adapter: Optional[HTTPAdapter] = None
+_shared_adapter_lock = threading.Lock()
+
+
+def _get_shared_adapter() -> HTTPAdapter:
+    """
+    Return the process-wide adapter for OpenIPAM, creating it on first use.
+    """
+    global _shared_adapter
+    with _shared_adapter_lock:
+        if _shared_adapter is None:
+            _shared_adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=MAX_WORKERS,
+                # Retry transient API failures instead of failing the whole certbot run. Adding a
+                # record is not idempotent, so a POST is only retried when it could not connect.
+                max_retries=Retry(
+                    total=3,
+                    backoff_factor=0.3,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET', 'DELETE']),
+                ),
+            )
+        return _shared_adapter
 
 
 class _OpenIPAMClient:
@@ -74,6 +182,39 @@ class _OpenIPAMClient:
 
     def __init__(self, email: Optional[str],api_key: str) -> None:
         self.api_key = api_key
+        self._add_url = ACCOUNT_URL + 'dns/add/'
+        self._list_url = ACCOUNT_URL + 'dns/'
+        # Ids of the records created by this client, keyed on (record_name, record_content), so
+        # that cleanup does not need to look them up again.
+        self._id_cache: Dict[Tuple[str, str], Any] = {}
+        self._cached_session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def _session(self) -> requests.Session:
+        """
+        The HTTP session used for every API call, created on first use.
+
+        All sessions mount the same adapter, so connections to OpenIPAM are pooled process-wide
+        and reused by later clients (e.g. when renewing several lineages in one run).
+        """
+        # The first access usually comes from the perform/cleanup worker threads.
+        with self._session_lock:
+            if self._cached_session is None:
+                session = requests.Session()
+                session.headers['Authorization'] = f"Token {self.api_key}"
+                session.mount('https://', _get_shared_adapter())
+                self._cached_session = session
+            return self._cached_session
+
+    def close(self) -> None:
+        """
+        Release the HTTP session.
+
+        The pooled connections belong to the shared adapter and stay open for later clients.
+        """
+        with self._session_lock:
+            self._cached_session = None
 
     def add_txt_record(self, domain: str, record_name: str, record_content: str,
                        record_ttl: int) -> None:
@@ -84,26 +225,27 @@ class _OpenIPAMClient:
         :param str record_name: The record name (typically beginning with '_acme-challenge.').
         :param str record_content: The record content (typically the challenge validation).
         :param int record_ttl: The record TTL (number of seconds that the record may be cached).
+        :raises certbot.errors.PluginError: if an error occurs communicating with the OpenIPAM API
         """
+        data = {'dns_type': 'TXT',
+                'name': record_name,
+                'content': record_content,
+                'ttl': record_ttl}
+        logger.debug('Attempting to add record: %s', data)
         try:
-            data = {'dns_type': 'TXT',
-                    'name': record_name,
-                    'content': record_content,
-                    'ttl': record_ttl}
-            logger.debug('Attempting to add record: %s', data)
-            res = requests.post(
-                f"{ACCOUNT_URL}dns/add/",
-                data,
-                headers={
-                    "Authorization": f"Token {self.api_key}",
-                },
-            )
-            if res.status_code != 201:
-                raise Exception(f"Failed to add DNS record: {res.text}")
-        except Exception as e:
-            print(f"Error: {e}")
-            print("Unable to create DNS record automatically.")
+            res = self._session.post(self._add_url, json=data)
+        except requests.RequestException as e:
+            raise errors.PluginError(f"OpenIPAM add_txt_record failed: {e}") from e
+        if res.status_code != 201:
+            raise errors.PluginError(f"Failed to add DNS record: {res.text}")
 
+        try:
+            body = res.json()
+        except ValueError:
+            body = None
+        record_id = body.get('id') if isinstance(body, dict) else None
+        if record_id is not None:
+            self._id_cache[(record_name, record_content)] = record_id
         logger.debug('Successfully added TXT record: %s', record_name)
 
     def del_txt_record(self, domain: str, record_name: str, record_content: str) -> None:
@@ -115,24 +257,23 @@ class _OpenIPAMClient:
 
         Failures are logged, but not raised.
 
+        The id returned when the record was added is used if available; otherwise the record is
+        looked up by name.
+
         :param str record_name: The record name (typically beginning with '_acme-challenge.').
         """
-        record_id = self._find_txt_record_id(record_name)
+        record_id = self._id_cache.pop((record_name, record_content), None)
+        if record_id is None:
+            record_id = self._find_txt_record_id(record_name)
         if record_id:
             try:
                 logger.debug('Attempting to delete record: %s', record_name)
-                res = requests.delete(
-                    f"{ACCOUNT_URL}dns/{record_id}/delete/",
-                    headers={
-                        "Authorization": f"Token {self.api_key}",
-                    },
-                )
+                res = self._session.delete(f"{self._list_url}{record_id}/delete/")
                 if res.status_code != 204:
                     raise Exception(f"Failed to delete DNS record: {res.text}")
                 logger.debug('Successfully deleted TXT record with record_id: %s', record_id)
             except Exception as e:
-                print(f"Error: {e}")
-                print("Unable to delete DNS record automatically.")
+                logger.warning('Unable to delete DNS record automatically: %s', e)
         else:
             logger.debug('TXT record not found; no cleanup needed.')
 
@@ -146,22 +287,18 @@ class _OpenIPAMClient:
         """
         try:
             logger.debug('Attempting to find record: %s', record_name)
-            res = requests.get(
-                f"{ACCOUNT_URL}dns/?name={record_name}",
-                headers={
-                    "Authorization": f"Token {self.api_key}",
-                },
-            )
+            res = self._session.get(self._list_url, params={'name': record_name})
             if res.status_code != 200:
                 raise Exception(f"Failed to find DNS record: {res.text}")
-            records = json.loads(res.content)
+            records = res.json()
         except Exception as e:
-            print(f"Error: {e}")
+            logger.warning('OpenIPAM API error: %s', e)
             records = []
 
-        if records:
+        results = records.get('results') if isinstance(records, dict) else records
+        if results:
             # Cleanup is returning the system to the state we found it. If, for some reason,
             # there are multiple matching records, we only delete one because we only added one.
-            return records['results'][0]['id']
+            return results[0]['id']
         logger.debug('Unable to find TXT record.')
         return None
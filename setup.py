@@ -7,16 +7,18 @@ from setuptools import setup
 version = '1.0.0'
 
 install_requires = [
+    'requests',
     'setuptools>=39.0.1',
+    'urllib3>=1.26',
 ]
 
 if not os.environ.get('SNAP_BUILD'):
     install_requires.extend([
-        # We specify the minimum acme and certbot version as the current plugin
-        # version for simplicity. See
+        # certbot 1.18.0 is the first release with display_util.notify, which
+        # the plugin uses to announce the propagation wait. See
         # https://github.com/certbot/certbot/issues/8761 for more info.
-        f'acme>={version}',
-        f'certbot>={version}',
+        'acme>=1.18.0',
+        'certbot>=1.18.0',
     ])
 elif 'bdist_wheel' in sys.argv[1:]:
     raise RuntimeError('Unset SNAP_BUILD when building wheels '